@@ -46,6 +46,29 @@ class Config:
 
         return config_data
 
+    @classmethod
+    def history(cls):
+        """
+        (host, port, id, pw, db) of the history database.
+        the 'history' section can override the connection info of the 'database' section.
+
+        """
+        try:
+            config_data = dict(cls.database() or {})
+            config_data.update(cls.CONFIG_DATA.get("history") or {})
+            history_info = (
+                config_data["host"],
+                config_data["port"],
+                config_data["id"],
+                config_data["pw"],
+                config_data["db"],
+            )
+        except Exception as ex:
+            print(f"invalid configuration(history): \n{ex}")
+            history_info = None
+
+        return history_info
+
     @classmethod
     def history_table(cls):
         try:
@@ -33,20 +33,20 @@ class LoggerObject:
         self.__real_attr = level
         self.logger.setLevel(level)
 
-    def debug(self, message):
-        return self.logger.debug(message)
+    def debug(self, message, *args):
+        return self.logger.debug(message, *args)
 
-    def info(self, message):
-        return self.logger.info(message)
+    def info(self, message, *args):
+        return self.logger.info(message, *args)
 
-    def warning(self, message):
-        return self.logger.warning(message)
+    def warning(self, message, *args):
+        return self.logger.warning(message, *args)
 
-    def error(self, message):
-        return self.logger.error(message, exc_info=True)
+    def error(self, message, *args):
+        return self.logger.error(message, *args, exc_info=True)
 
-    def critical(self, message):
-        return self.logger.critical(message)
+    def critical(self, message, *args):
+        return self.logger.critical(message, *args)
 
 
 class Logger:
@@ -10,15 +10,23 @@ BASE = declarative_base()
 SESSION = None
 
 
-def initialize_global_database(user_name, user_password, host, port, db_name):
+def initialize_global_database(
+    user_name, user_password, host, port, db_name, **engine_options
+):
+    """
+    create the global engine and session factory only once.
+    engine_options(pool_size, max_overflow, ...) are passed to create_engine as they are.
+
+    """
     global SESSION
 
     if SESSION:
-        return
+        return SESSION
 
     engine = create_engine(
         f"postgresql+psycopg2://{user_name}:{user_password}@{host}:{port}/{db_name}",
         echo=False,
+        **engine_options,
     )
 
     SESSION = sessionmaker(bind=engine)
@@ -31,6 +39,8 @@ def initialize_global_database(user_name, user_password, host, port, db_name):
 
     BASE.metadata.create_all(engine)
 
+    return SESSION
+
 
 def get_session() -> Session:
     global SESSION
@@ -22,6 +22,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         log_level="info",
+        loop="uvloop",
         reload=True,
         timeout_keep_alive=3600,
     )
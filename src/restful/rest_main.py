@@ -1,3 +1,5 @@
+import sys
+import asyncio
 from fastapi import FastAPI
 from typing import Optional
 
@@ -10,7 +12,7 @@ from restful.rest_method import (
 )
 
 from restful.rest_type import Schedule, ScheduleResult, ScheduleResultCount
-from schedule.scheduler import Scheduler
+from schedule.scheduler import initialize_global_scheduler, get_scheduler
 
 
 fast_api = FastAPI(
@@ -26,17 +28,25 @@ fast_api = FastAPI(
 
 @fast_api.on_event("startup")
 async def startup_event():
-    schedule_handler = Scheduler()
+    # run new tasks eagerly until their first real await (python 3.12+)
+    if sys.version_info >= (3, 12):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+    schedule_handler = initialize_global_scheduler()
     schedule_handler.initialize()
 
 
 @fast_api.on_event("shutdown")
 async def shutdown_event():
-    Scheduler.finalize()
+    schedule_handler = get_scheduler()
+    schedule_handler.finalize()
+    await schedule_handler.stop_flush_history()
 
 
+# the schedule endpoints call the blocking schedule queue, so they are plain functions
+# which fastapi runs in its threadpool instead of on the event loop.
 @fast_api.post("/schedules")
-async def register_schedule(inputs: Schedule) -> ScheduleResult:
+def register_schedule(inputs: Schedule) -> ScheduleResult:
     """
     register a schedule event
     """
@@ -44,7 +54,7 @@ async def register_schedule(inputs: Schedule) -> ScheduleResult:
 
 
 @fast_api.post("/schedules/{id}/update")
-async def update_schedule(id: str, inputs: Schedule) -> ScheduleResult:
+def update_schedule(id: str, inputs: Schedule) -> ScheduleResult:
     """
     register a schedule event
     """
@@ -52,7 +62,7 @@ async def update_schedule(id: str, inputs: Schedule) -> ScheduleResult:
 
 
 @fast_api.delete("/schedules/{id}")
-async def delete_schedule(id: str) -> ScheduleResultCount:
+def delete_schedule(id: str) -> ScheduleResultCount:
     """
     unregister a schedule event
     """
@@ -60,7 +70,7 @@ async def delete_schedule(id: str) -> ScheduleResultCount:
 
 
 @fast_api.delete("/schedules")
-async def delete_schedule(
+def delete_schedule(
     application: str = "",
     group: str = "",
     type: str = "",
@@ -74,7 +84,7 @@ async def delete_schedule(
 
 
 @fast_api.get("/schedules")
-async def get_schedules(
+def get_schedules(
     application: str = "",
     group: str = "",
     type: str = "",
@@ -88,7 +98,7 @@ async def get_schedules(
 
 
 @fast_api.get("/schedules/{id}")
-async def get_schedules_with_resp_id(id: str) -> list:
+def get_schedules_with_resp_id(id: str) -> list:
     """
     list all registered events
     """
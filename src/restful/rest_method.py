@@ -1,7 +1,7 @@
 import traceback
 
 from restful.rest_type import Schedule
-from schedule.scheduler import Scheduler
+from schedule.scheduler import get_scheduler
 
 import sys
 from helper.logger import Logger
@@ -16,16 +16,17 @@ log_error = log_message.error
 
 
 def restapi_register(schedule: Schedule):
-    log_info(f"request registration: {schedule.dict()}")
-    scheduler = Scheduler()
-    return scheduler.register(schedule)
+    schedule_event = schedule.dict()
+    log_info(f"request registration: {schedule_event}")
+    scheduler = get_scheduler()
+    return scheduler.register(schedule_event)
 
 
 def restapi_delete_schedule_with_id(
     schedule_id: str,
 ):
     log_info(f"request delete(id): {schedule_id}")
-    scheduler = Scheduler()
+    scheduler = get_scheduler()
     return scheduler.delete_schedules_with_id(schedule_id)
 
 
@@ -39,7 +40,7 @@ def restapi_delete_schedule_with_client(
     log_info(
         f"request delete(client): {client_operation}, {client_application}, {client_group}, {client_key}, {client_type}"
     )
-    scheduler = Scheduler()
+    scheduler = get_scheduler()
     return scheduler.delete_schedules_with_client(
         client_operation, client_application, client_group, client_key, client_type
     )
@@ -49,7 +50,7 @@ def restapi_get_schedules_with_id(
     resp_id: str,
 ) -> list:
     log_info(f"request get_schedules - resp_id({resp_id})")
-    schedule_handler = Scheduler()
+    schedule_handler = get_scheduler()
     return schedule_handler.get_schedules_with_id(resp_id)
 
 
@@ -64,7 +65,7 @@ def restapi_get_schedules_with_client(
     log_info(
         f"request get_schedules(client) - group({client_group}), application({client_application}), operation({client_operation}), key({client_key}, type({client_type}))"
     )
-    schedule_handler = Scheduler()
+    schedule_handler = get_scheduler()
     return schedule_handler.get_schedules_with_client(
         client_operation, client_application, client_group, client_key, client_type
     )
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+import math
+from pydantic import BaseModel, Field, validator
 from typing import Optional
 from enum import Enum
 
@@ -23,6 +24,24 @@ class ScheduleClient(BaseModel):
     operation: Optional[str] = Field(default="", title="Operation name")
 
 
+def check_finite_numbers(value):
+    """
+    NaN/Infinity is not a valid json number and the schedule queue(orjson) can't store it,
+    so it is rejected when a schedule is registered.
+
+    """
+    if isinstance(value, dict):
+        for item in value.values():
+            check_finite_numbers(item)
+    elif isinstance(value, list):
+        for item in value:
+            check_finite_numbers(item)
+    elif isinstance(value, float) and not math.isfinite(value):
+        raise ValueError("NaN or Infinity is not allowed")
+
+    return value
+
+
 class ScheduleTask(BaseModel):
     type: str = Field(default="", title="Task type [rest | kafka | redis]")
     connection: dict = Field(
@@ -49,6 +68,10 @@ class ScheduleTask(BaseModel):
         title="Retry count limit",
     )
 
+    _check_finite_numbers = validator("connection", "data", allow_reuse=True)(
+        check_finite_numbers
+    )
+
 
 class Schedule(BaseModel):
     name: str = Field(default="", title="Schedule name")
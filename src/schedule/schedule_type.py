@@ -1,5 +1,6 @@
 from enum import Enum
 from datetime import datetime
+from functools import lru_cache
 
 # from croniter import croniter
 import pytz
@@ -37,6 +38,8 @@ class ScheduleType:
     CRON = "cron"
     DELAY_RECUR = "delay-recur"
 
+    RECURRING_TYPES = [CRON, DELAY_RECUR]
+
     @staticmethod
     def is_available_type(schedule_type):
         return schedule_type in [
@@ -49,7 +52,17 @@ class ScheduleType:
 
     @staticmethod
     def is_recurring(schedule_type):
-        return schedule_type in [ScheduleType.CRON, ScheduleType.DELAY_RECUR]
+        return schedule_type in ScheduleType.RECURRING_TYPES
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_cron_time(schedule: str, tz: str) -> CronTime:
+        """
+        parse the cron expression only once per (schedule, timezone).
+        get_next() doesn't change the parsed CronTime, so it can be shared.
+
+        """
+        return CronTime(schedule, tz)
 
     @staticmethod
     def get_next_and_delay(schedule_event, tz):
@@ -60,7 +73,7 @@ class ScheduleType:
             """
             TODO: check if this routine doesn't have any exception or issue
             """
-            cron_time = CronTime(schedule_event["schedule"], tz)
+            cron_time = ScheduleType.get_cron_time(schedule_event["schedule"], tz)
             next_datetime = cron_time.get_next(base, "Asia/Seoul")
             next_time = next_datetime.timestamp()
             delay = next_time - datetime.timestamp(base)
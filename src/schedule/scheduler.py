@@ -1,20 +1,19 @@
 import asyncio
 import uuid
-from datetime import datetime, timezone
+import time
 from fastapi import HTTPException
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime
-from time import sleep
 
-from restful.rest_type import Schedule
 from config import Config
 from schedule_queue.pg_schedule_queue import PGScheduleQueue
 from schedule.schedule_type import ScheduleType, ScheduleTaskStatus
 from task.task_mgr import TaskManager
 from task.task_import import TASK_ACTIVE_MODULE_LIST
 
-from history.db_engine import initialize_global_database, get_session
+from history.db_engine import initialize_global_database
 from history.tables.table_schedule_history import ScheduleEventHistory
 
 
@@ -34,74 +33,133 @@ log_error = log_message.error
 
 
 class Scheduler:
-    # singleton constructor set
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(cls, "_instance"):
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
     def __init__(self):
-        # to be called once
-        cls = type(self)
-        if not hasattr(cls, "_init"):
-            try:
-                # TODO: need to the generalization of schedule_queue creation...
-                database_info = Config.database()
-                self.schedule_queue = PGScheduleQueue(database_info)
-                self.running_schedules = dict()
-                self.finalized = False
-                self.fetch_interval = Config.get("scheduler").get("fetch_interval", 0.5)
-                self.fetch_count = Config.get("scheduler").get("fetch_count", 1)
-
-                cls._init = True
-            except Exception as ex:
-                raise ex
-
-    @classmethod
-    def fetch_schedules_periodically(cls, async_process_loop):
-        log_debug(f"called do_periodic_process: {str(datetime.now())}")
-
-        scheduler = cls()
-        while not scheduler.finalized:
-            # 1. pop the schedule with the lowest next_schedule value
-            schedules = list()
-            for _ in range(scheduler.fetch_count):
-                schedule = scheduler.schedule_queue.pop()
-                schedules += schedule
-            log_debug(f"schedules: {schedules}")
+        # TODO: need to the generalization of schedule_queue creation...
+        database_info = Config.database()
+        self.schedule_queue = PGScheduleQueue(database_info)
+        self.running_schedules = dict()
+        self.running_schedules_lock = threading.Lock()
+        self.finalize_event = threading.Event()
+        self.loop = None
+        self.fetch_interval = Config.get("scheduler").get("fetch_interval", 0.5)
+        self.fetch_count = Config.get("scheduler").get("fetch_count", 1)
+        self.max_running_schedules = Config.get("scheduler").get(
+            "max_running_schedules", 100
+        )
+        self.executor_workers = Config.get("scheduler").get("executor_workers", 8)
+        self.history_session = None
+        self.history_session_lock = threading.Lock()
+        self.history_queue = None
+        self.history_flush_task = None
+        self.history_unsaved_records = list()
+        self.history_batch_size = Config.get("scheduler").get(
+            "history_batch_size", 32
+        )
+        self.history_flush_interval = Config.get("scheduler").get(
+            "history_flush_interval", 0.05
+        )
+
+    def fetch_schedules_periodically(self, async_process_loop):
+        log_debug("called do_periodic_process: %s", datetime.now())
+
+        # bind the attributes used in every iteration to locals once
+        pop = self.schedule_queue.pop
+        start_process_schedules = self.start_process_schedules
+        is_finalized = self.finalize_event.is_set
+        wait_finalized = self.finalize_event.wait
+        running_schedules = self.running_schedules
+        fetch_count = self.fetch_count
+        fetch_interval = self.fetch_interval
+        max_running_schedules = self.max_running_schedules
+
+        while not is_finalized():
+            # 0. don't claim more schedules than max_running_schedules are in flight
+            pop_count = min(
+                fetch_count, max_running_schedules - len(running_schedules)
+            )
+            if pop_count <= 0:
+                wait_finalized(fetch_interval)
+                continue
+
+            # 1. pop up to pop_count schedules with the lowest next_schedule values at once
+            schedules = pop(pop_count)
+            log_debug("schedules: %s", schedules)
 
             if len(schedules) > 0:
-                scheduler.start_process_schedules(schedules, async_process_loop)
+                start_process_schedules(schedules, async_process_loop)
 
-            # TODO: 0.5(500ms) is a part of this application configuration.
-            sleep(scheduler.fetch_interval)
+            # wait fetch_interval only when the due schedules are drained,
+            # the wait returns immediately when the scheduler is finalized.
+            if len(schedules) < pop_count:
+                wait_finalized(fetch_interval)
 
     def start_fetch_schedules(self):
         self.schedule_thread = threading.Thread(
-            target=Scheduler.fetch_schedules_periodically,
+            target=self.fetch_schedules_periodically,
             args=[
-                asyncio.get_event_loop(),
+                self.loop,
             ],
         )
         self.schedule_thread.start()
 
     def stop_schedule(self):
-        self.finalized = True
+        self.finalize_event.set()
 
     def initialize(self):
         try:
+            # 0. keep the running loop which all the schedule tasks are dispatched to.
+            #    initialize() should be called on the loop (e.g. in the startup event)
+            self.loop = asyncio.get_running_loop()
             # 1. initialize the schedule queue
             self.schedule_queue.initialize()
+            # 1.1 bound the worker threads which run the blocking database calls
+            self.loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=self.executor_workers)
+            )
             # 2. start the periodic process
             self.start_fetch_schedules()
+            # 3. start the batched writer of the history records
+            self.start_flush_history()
             log_info("initialization done..")
         except Exception as ex:
             log_error(f"Initializaiton Error: {ex}")
 
-    @classmethod
-    def finalize(cls):
-        scheduler = cls()
-        scheduler.stop_schedule()
+    def get_history_session(self):
+        """
+        create the engine(connection pool) of the history database when the first history record is saved and
+        return its session factory, so that the later records reuse pooled connections.
+        nothing is created(or connected) while the history is not used.
+
+        """
+        with self.history_session_lock:
+            if self.history_session is None:
+                self.history_session = self.initialize_history_database()
+        return self.history_session
+
+    def initialize_history_database(self):
+        history_db_info = Config.history()
+        if not history_db_info:
+            return None
+
+        try:
+            (host, port, id, pw, db) = history_db_info
+            return initialize_global_database(
+                id,
+                pw,
+                host,
+                port,
+                db,
+                pool_size=5,
+                max_overflow=10,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+            )
+        except Exception as ex:
+            log_error(f"can't initialize history database - {ex}")
+            return None
+
+    def finalize(self):
+        self.stop_schedule()
 
     def is_task_available(self, type: str, connection_info: dict) -> bool:
         """
@@ -135,14 +193,14 @@ class Scheduler:
             ]
         )
 
-    def register(self, schedule: Schedule):
+    def register(self, schedule_event: dict):
         """
         TODO: 초기 설정 시에 등록된 스케줄을 바로 실행하는 구조가 아니고,
         말 그대로 동작만 하는 경우로서 예외가 없는지 확인이 필요하다.
+
+        schedule_event는 Schedule.dict()의 결과로, 호출자가 한번만 변환하여 전달하며 이 함수에서 직접 변경된다.
         """
         try:
-            schedule_event = schedule.dict()
-
             # 1. check if unique key(operation) is duplicated.
 
             # 2. calculate next timestamp and delay based on schedule_event
@@ -166,19 +224,11 @@ class Scheduler:
             # 5. store the updated schedule event
             client_info = schedule_event.get("client")
             schedule_unique_name = self.generate_client_unique_name(client_info)
-            (id, _, _, _) = self.schedule_queue.get_with_name(
-                schedule_unique_name, True
+            # 5.1 if duplicated, the previous one is replaced and keeps its id.
+            # 5.2 if not duplicated, it is stored with the new id.
+            schedule_id = self.schedule_queue.put(
+                str(uuid.uuid4()), schedule_unique_name, next_time, schedule_event
             )
-            # 5.1 if duplicated, delete the previous one and register new one with the same id
-            if id:
-                schedule_id = id
-                self.schedule_queue.update(id, next_time, schedule_event)
-            # 5.2 if not duplicated, create a new id
-            else:
-                schedule_id = str(uuid.uuid4())
-                self.schedule_queue.put(
-                    schedule_id, schedule_unique_name, next_time, schedule_event
-                )
 
             # self.put_event_to_history_db("register", schedule_event)
 
@@ -203,14 +253,14 @@ class Scheduler:
             if type(schedule_id) is not str or schedule_id == "":
                 raise Exception(f"schedule_id is not available.. {schedule_id}")
 
-            (_, schedule) = self.schedule_queue.delete_with_id(schedule_id)
-            # if schedule:
+            deleted_list = self.schedule_queue.delete_with_id(schedule_id)
+            # for schedule in deleted_list:
             #     self.put_event_to_history_db("unregister", schedule)
 
         except Exception as ex:
             raise ex
 
-        return {"count": 1 if schedule else 0}
+        return {"count": len(deleted_list)}
 
     def delete_schedules_with_id(
         self,
@@ -315,23 +365,13 @@ class Scheduler:
         return found_schedules
 
     def process_retry_non_recur_event(self, schedule_id, schedule_name, schedule):
-        task_info = schedule["task"]
-        base = datetime.now(timezone.utc)
-
-        # 1. check if the current retry count is over the max retry count
-        retry_count = task_info.get("retry_count", 0)
-        max_retry_count = task_info.get("max_retry_count", -1)
-        if (max_retry_count != -1) and (retry_count >= max_retry_count):
-            log_info(
-                f"Retry count({retry_count}) is over max_retry_count({max_retry_count})."
-            )
-            return
+        # the retry count was already checked against max_retry_count in postprocess_schedule
 
-        # 2. calculate the next timestamp and delay based on schedule
+        # 1. calculate the next timestamp and delay based on schedule
         retry_wait = schedule.get("retry_wait", 60)
-        schedule["next"] = datetime.timestamp(base) + retry_wait
+        schedule["next"] = int(time.time()) + retry_wait
 
-        # 3. put this schedule to queue
+        # 2. put this schedule to queue
         # self.schedule_queue.put(schedule_id, schedule_name, schedule["next"], schedule)
         self.schedule_queue.update(schedule_id, schedule["next"], schedule)
 
@@ -342,12 +382,33 @@ class Scheduler:
             async_process_loop,
         )
 
-        # add the name of the current schedlue event to event_name list.
-        # to check the duplicated schedule name later
-        self.running_schedules[id] = handle_event_future
+        # add the ids of the current schedules to running_schedules
+        # to check the duplicated schedule later.
+        # the fetch thread adds them and the loop thread removes them when done.
+        schedule_ids = [schedule["id"] for schedule in schedules]
+        with self.running_schedules_lock:
+            for schedule_id in schedule_ids:
+                self.running_schedules[schedule_id] = handle_event_future
+
+        handle_event_future.add_done_callback(
+            lambda future: self.remove_running_schedules(schedule_ids, future)
+        )
         return handle_event_future
 
+    def remove_running_schedules(self, schedule_ids: list, future):
+        with self.running_schedules_lock:
+            for schedule_id in schedule_ids:
+                # keep the entry if the schedule was fetched again in the meantime
+                if self.running_schedules.get(schedule_id) is future:
+                    del self.running_schedules[schedule_id]
+
     async def process_schedules(self, schedules: list):
+        # bind the methods called for every schedule to locals once
+        get_task_cls = TaskManager.get
+        generate_client_unique_name = self.generate_client_unique_name
+        postprocess_schedule = self.postprocess_schedule
+        to_thread = asyncio.to_thread
+
         try:
             for schedule in schedules:
                 id = schedule["id"]
@@ -363,19 +424,19 @@ class Scheduler:
                     task_info["status"] = ScheduleTaskStatus.PROCESSING
 
                     # 3. run a task based on task parameters
-                    task_cls = TaskManager.get(task_info["type"])
+                    task_cls = get_task_cls(task_info["type"])
                     task = task_cls()
 
                     task.connect(**task_info)
-                    log_debug(f"task run: {task_info}")
+                    log_debug("task run: %s", task_info)
                     res = await task.run(**schedule)
-                    log_debug(f"handle_event done: {name}, res: {str(res)}")
+                    log_debug("handle_event done: %s, res: %s", name, res)
 
                     client_info = schedule["client"]
-                    schedule_name = self.generate_client_unique_name(client_info)
+                    schedule_name = generate_client_unique_name(client_info)
 
-                    # 4. put the next schedule
-                    self.postprocess_schedule(res, id, schedule_name, schedule)
+                    # 4. put the next schedule (blocking db call, so run it in a worker thread)
+                    await to_thread(postprocess_schedule, res, id, schedule_name, schedule)
                 except Exception as ex:
                     log_error(f"Exception: {ex}")
 
@@ -424,6 +485,7 @@ class Scheduler:
                         f"Retry count({retry_count}) is over max_retry_count({max_retry_count})."
                     )
                     task_info["status"] = ScheduleTaskStatus.INVALIDITY
+                    self.schedule_queue.move_to_dlq(schedule_id, schedule)
                     return
 
             # 2. get the schedule timezone
@@ -479,6 +541,8 @@ class Scheduler:
 
         히스토리 테이블의 효용성에 대한 검증 이후에 확인 필요.
 
+        이력은 바로 저장되지 않고 history_queue에 쌓인 후, flush_history_periodically에서 한번에 저장된다.
+
         """
         try:
             task_info = schedule_event.get("task", {})
@@ -487,24 +551,113 @@ class Scheduler:
                 hischeck = task_info.get("history_check", False)
                 # TODO: check if history fucntion is necessary...
                 hischeck = False
-                db_connection_info = Config.history()
-                if hischeck and db_connection_info:
-                    (host, port, id, pw, db) = db_connection_info
-                    initialize_global_database(id, pw, host, port, db)
-                    with get_session() as db_session:
-                        schevt_history = ScheduleEventHistory(
-                            event=event,
-                            name=client_info.get("name"),
-                            key=client_info.get("key"),
-                            group=client_info.get("group"),
-                            type=schedule_event.get("type"),
-                            schedule=schedule_event.get("schedule"),
-                            task_type=task_info.get("type"),
-                            task_connection=task_info.get("connection"),
-                            task_data=task_info.get("data"),
-                        )
-
-                        db_session.add(schevt_history)
-                        db_session.commit()
+                if hischeck and self.history_queue:
+                    schevt_history = ScheduleEventHistory(
+                        event=event,
+                        name=client_info.get("name"),
+                        key=client_info.get("key"),
+                        group=client_info.get("group"),
+                        type=schedule_event.get("type"),
+                        schedule=schedule_event.get("schedule"),
+                        task_type=task_info.get("type"),
+                        task_connection=task_info.get("connection"),
+                        task_data=task_info.get("data"),
+                    )
+                    # asyncio.Queue isn't thread-safe and this can be called in worker threads
+                    self.loop.call_soon_threadsafe(
+                        self.history_queue.put_nowait, schevt_history
+                    )
         except Exception as ex:
             log_error(f"can't save event to db - {ex}")
+
+    def save_history_records(self, history_records: list):
+        try:
+            history_session = self.get_history_session()
+            if history_session is None:
+                log_error(
+                    f"can't save {len(history_records)} events to db - no history db"
+                )
+                return
+
+            with history_session() as db_session:
+                db_session.add_all(history_records)
+                db_session.commit()
+        except Exception as ex:
+            log_error(f"can't save {len(history_records)} events to db - {ex}")
+
+    def start_flush_history(self):
+        self.history_queue = asyncio.Queue()
+        self.history_flush_task = self.loop.create_task(
+            self.flush_history_periodically()
+        )
+
+    async def flush_history_periodically(self):
+        """
+        history_queue에 쌓인 이력을 최대 history_batch_size개 혹은 history_flush_interval(초) 단위로 모아서
+        한번의 commit으로 저장한다.
+
+        """
+        loop = self.loop
+        history_records = list()
+        try:
+            while True:
+                history_records = [await self.history_queue.get()]
+                deadline = loop.time() + self.history_flush_interval
+                while len(history_records) < self.history_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        history_records.append(
+                            await asyncio.wait_for(self.history_queue.get(), timeout)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+
+                # the worker thread finishes the save even if this task is cancelled
+                (saving_records, history_records) = (history_records, list())
+                await asyncio.to_thread(self.save_history_records, saving_records)
+        finally:
+            # hand the records already taken from the queue over to stop_flush_history
+            # when cancelled, not to commit them on the loop
+            self.history_unsaved_records = history_records
+
+    async def stop_flush_history(self):
+        if self.history_flush_task:
+            self.history_flush_task.cancel()
+            try:
+                await self.history_flush_task
+            except asyncio.CancelledError:
+                pass
+            self.history_flush_task = None
+
+        # save the records taken by the cancelled task and the remaining ones in the queue
+        (history_records, self.history_unsaved_records) = (
+            self.history_unsaved_records,
+            list(),
+        )
+        while self.history_queue and not self.history_queue.empty():
+            history_records.append(self.history_queue.get_nowait())
+
+        if history_records:
+            await asyncio.to_thread(self.save_history_records, history_records)
+
+
+SCHEDULER = None
+
+
+def initialize_global_scheduler() -> Scheduler:
+    """
+    create the scheduler only once, it should be called before get_scheduler()
+
+    """
+    global SCHEDULER
+
+    if SCHEDULER is None:
+        SCHEDULER = Scheduler()
+
+    return SCHEDULER
+
+
+def get_scheduler() -> Scheduler:
+    return SCHEDULER
@@ -1,19 +1,60 @@
 import sys
+import re
 import time
 import json
+import threading
+import orjson
 
 import psycopg2 as pg2
-from datetime import datetime
 
 from schedule_queue.queue_abstraction import ScheduleQueue
+from schedule.schedule_type import ScheduleType
 from config import Config
 
 
+# orjson reads the integers beyond 64-bit(< -2**63 or > 2**64 - 1) as float,
+# so a payload having a 19+ digit number, which may be one of them, is read by json
+LONG_NUMBER_PATTERN = re.compile(r"\d{19}")
+
+
+class NonFiniteFloat(float):
+    """
+    NaN/Infinity read from the payloads stored by json.
+    orjson refuses to write a float subclass, so dumps_payload() writes it back with json as it was.
+
+    """
+
+    pass
+
+
+def loads_payload(payload: str) -> dict:
+    if not LONG_NUMBER_PATTERN.search(payload):
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            pass
+
+    # NaN/Infinity or the integers beyond 64-bit, which only json reads as they were written
+    return json.loads(payload, parse_constant=NonFiniteFloat)
+
+
+def dumps_payload(payload: dict) -> str:
+    try:
+        return orjson.dumps(payload).decode()
+    except TypeError:
+        # the integers beyond 64-bit or NaN/Infinity from loads_payload()
+        return json.dumps(payload)
+
+
 class PGScheduleQueue(ScheduleQueue):
     SCHEDULE_TABLE = Config.scheduler_table() or "schedule_queue"
+    DLQ_TABLE = f"{SCHEDULE_TABLE}_dlq"
 
     def __init__(self, db_config):
         self.initialized: bool = False
+        # the connection(and its transaction) is shared by the fetch thread, worker threads
+        # and api handlers, so each statement and its commit/rollback runs under this lock
+        self.dbconn_lock = threading.RLock()
         try:
             self.dbconn = None
             while self.dbconn is None:
@@ -57,6 +98,15 @@ class PGScheduleQueue(ScheduleQueue):
                         INCLUDE (id)
                         WHERE processing_started_at IS NULL;
 
+                        CREATE TABLE IF NOT EXISTS {PGScheduleQueue.DLQ_TABLE} (
+                            id UUID NOT NULL PRIMARY KEY,
+                            name VARCHAR(255) NOT NULL,
+                            next_schedule bigint,
+                            created_at TIMESTAMP NOT NULL,
+                            moved_at TIMESTAMP NOT NULL,
+                            payload TEXT
+                        );
+
                     """
                 )
 
@@ -76,14 +126,50 @@ class PGScheduleQueue(ScheduleQueue):
             raise Exception("Database is not initialized.")
 
     def _generate_schedule_dict(self, id: str, payload: str) -> dict:
-        payload_dict = json.loads(payload) if type(payload) == str else payload
+        payload_dict = loads_payload(payload) if type(payload) == str else payload
         payload_dict["id"] = id
         return payload_dict
 
+    def _generate_client_condition(
+        self,
+        client_operation: str,
+        client_application: str,
+        client_group: str,
+        client_key: str,
+        client_type: str,
+    ):
+        """
+        name is composed of '{application},{group},{type},{key},{operation}'.
+        when all the client fields are given, name is matched directly via its unique index.
+        otherwise, only the given fields are compared with the parts of name.
+
+        """
+        client_fields = [
+            client_application,
+            client_group,
+            client_type,
+            client_key,
+            client_operation,
+        ]
+
+        if all(client_fields):
+            return ("name = %s", (",".join(client_fields),))
+
+        conditions = list()
+        params = list()
+        for (position, client_field) in enumerate(client_fields, start=1):
+            if client_field:
+                conditions.append(f"split_part(name, ',', {position}) = %s")
+                params.append(client_field)
+
+        return (" AND ".join(conditions) if conditions else "TRUE", tuple(params))
+
     def put(self, id, name, next_schedule, payload):
         """
         TODO: id(PK)에 대한 중복 처리에 대한 고민 필요
 
+        name이 이미 존재하면 기존 id를 유지한 채 스케줄을 갱신하고(update와 동일), 저장된 id를 반환한다.
+
         """
 
         self.check_database_initialized()
@@ -91,21 +177,30 @@ class PGScheduleQueue(ScheduleQueue):
         # TODO: need to configure this table name
         table_name = PGScheduleQueue.SCHEDULE_TABLE
 
-        payload_str = json.dumps(payload) if type(payload) == dict else payload
+        payload_str = dumps_payload(payload) if type(payload) == dict else payload
 
         sql_put = f"""
         INSERT INTO {table_name} (id, name, next_schedule, created_at, processing_started_at, payload)
-            VALUES (%s, %s, %s, %s, NULL, %s)
+            VALUES (%s, %s, %s, NOW() AT TIME ZONE 'UTC', NULL, %s)
             ON CONFLICT (name)
-            DO UPDATE SET (next_schedule, payload) = (EXCLUDED.next_schedule, EXCLUDED.payload);
+            DO UPDATE SET (next_schedule, processing_started_at, payload) = (EXCLUDED.next_schedule, NULL, EXCLUDED.payload)
+            RETURNING id;
         """
 
-        with self.dbconn.cursor() as cursor:
-            cursor.execute(
-                sql_put,
-                (id, name, next_schedule, str(datetime.utcnow()), payload_str),
-            )
-        self.dbconn.commit()
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(
+                        sql_put,
+                        (id, name, next_schedule, payload_str),
+                    )
+                    (stored_id,) = cursor.fetchone()
+                self.dbconn.commit()
+            except Exception as ex:
+                self.dbconn.rollback()
+                raise ex
+
+        return str(stored_id)
 
     def delete_with_id(self, id):
         self.check_database_initialized()
@@ -118,14 +213,17 @@ class PGScheduleQueue(ScheduleQueue):
         
         """
 
-        with self.dbconn.cursor() as cursor:
-            cursor.execute(sql_delete, (id,))
-            fetch_results = cursor.fetchall()
-
-        self.dbconn.commit()
-
-        assert len(fetch_results) <= 1
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_delete, (id,))
+                    fetch_results = cursor.fetchall()
+                self.dbconn.commit()
+            except Exception as ex:
+                self.dbconn.rollback()
+                raise ex
 
+        # id is the primary key, so at most one row is deleted
         # TODO: convert payload to dict like 'json.loads(existed_schedule.decode("utf-8"))'
         results = list()
         for fetch_result in fetch_results:
@@ -145,7 +243,10 @@ class PGScheduleQueue(ScheduleQueue):
     ):
         self.check_database_initialized()
 
-        results = self.get_with_client(
+        # TODO: need to configure this table name
+        table_name = PGScheduleQueue.SCHEDULE_TABLE
+
+        (client_condition, client_params) = self._generate_client_condition(
             client_operation,
             client_application,
             client_group,
@@ -153,10 +254,27 @@ class PGScheduleQueue(ScheduleQueue):
             client_type,
         )
 
-        for result in results:
-            self.delete_with_id(result["id"])
+        sql_delete = f"""
+        DELETE FROM {table_name} WHERE processing_started_at IS NULL AND {client_condition}
+            RETURNING id, payload
 
-        return results
+        """
+
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_delete, client_params)
+                    fetch_results = cursor.fetchall()
+                self.dbconn.commit()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+                fetch_results = []
+
+        return [
+            self._generate_schedule_dict(fetch_result[0], fetch_result[1])
+            for fetch_result in fetch_results
+        ]
 
     def get_with_id(self, id):
         self.check_database_initialized()
@@ -169,15 +287,15 @@ class PGScheduleQueue(ScheduleQueue):
         
         """
 
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_get, (id,))
-                fetch_results = cursor.fetchall()
-        except Exception as ex:
-            print(ex, file=sys.stderr)
-            fetch_results = None
-
-        assert len(fetch_results) <= 1
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_get, (id,))
+                    fetch_results = cursor.fetchall()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+                fetch_results = []
 
         # TODO: convert payload to dict like 'json.loads(existed_schedule.decode("utf-8"))'
 
@@ -204,15 +322,15 @@ class PGScheduleQueue(ScheduleQueue):
         """
         )
 
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_get, (name,))
-                fetch_results = cursor.fetchall()
-        except Exception as ex:
-            print(ex, file=sys.stderr)
-            fetch_results = None
-
-        assert len(fetch_results) <= 1
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_get, (name,))
+                    fetch_results = cursor.fetchall()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+                fetch_results = []
 
         # TODO: convert payload to dict like 'json.loads(existed_schedule.decode("utf-8"))'
 
@@ -231,80 +349,85 @@ class PGScheduleQueue(ScheduleQueue):
         # TODO: need to configure this table name
         table_name = PGScheduleQueue.SCHEDULE_TABLE
 
+        (client_condition, client_params) = self._generate_client_condition(
+            client_operation,
+            client_application,
+            client_group,
+            client_key,
+            client_type,
+        )
+
         sql_get = f"""
-        SELECT id, name, payload from {table_name} WHERE processing_started_at IS NULL
-        
+        SELECT id, payload from {table_name} WHERE processing_started_at IS NULL AND {client_condition}
+
         """
 
-        results = list()
-
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_get)
-                fetch_results = cursor.fetchall()
-
-                for fetch_result in fetch_results:
-                    fetched_name = fetch_result[1]
-                    [
-                        fetched_application,
-                        fetched_group,
-                        fetched__type,
-                        fetched_key,
-                        fetched_operation,
-                    ] = fetched_name.split(",")
-
-                results = [
-                    fetch_result
-                    for fetch_result in fetch_results
-                    if (not client_operation or fetched_operation == client_operation)
-                    and (
-                        not client_application
-                        or fetched_application == client_application
-                    )
-                    and (not client_group or fetched_group == client_group)
-                    and (not client_key or fetched_key == client_key)
-                    and (not client_type or fetched__type == client_type)
-                ]
-        except Exception as ex:
-            print(ex, file=sys.stderr)
-            results = None
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_get, client_params)
+                    fetch_results = cursor.fetchall()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+                fetch_results = []
 
         return [
-            self._generate_schedule_dict(result[0], result[2]) for result in results
+            self._generate_schedule_dict(fetch_result[0], fetch_result[1])
+            for fetch_result in fetch_results
         ]
 
-    def pop(self):
+    def pop(self, count: int = 1):
+        """
+        due 상태인 스케줄을 next_schedule 순서로 최대 count개까지 하나의 SQL 문으로 가져온다.
+
+        """
+
         self.check_database_initialized()
 
         # TODO: need to configure this table name
         table_name = PGScheduleQueue.SCHEDULE_TABLE
 
         sql_pop = f"""
-        UPDATE {table_name} as sq SET processing_started_at = '{str(datetime.utcnow())}'
-        WHERE sq.id = (
+        UPDATE {table_name} as sq SET processing_started_at = NOW() AT TIME ZONE 'UTC'
+        WHERE sq.id IN (
             SELECT sqInner.id FROM {table_name} sqInner
-            WHERE sqInner.processing_started_at IS NULL AND sqInner.next_schedule <= {int(time.time())}
+            WHERE sqInner.processing_started_at IS NULL AND sqInner.next_schedule <= %s
             ORDER By sqInner.next_schedule ASC
-            LIMIT 1
+            LIMIT %s
             FOR UPDATE SKIP LOCKED
         )
         RETURNING sq.id, sq.name, sq.next_schedule, sq.payload
         """
 
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_pop)
-                pop_results = cursor.fetchall()
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_pop, (int(time.time()), count))
+                    # RETURNING doesn't keep the order of the subquery
+                    pop_results = sorted(
+                        cursor.fetchall(), key=lambda pop_result: pop_result[2]
+                    )
 
-            self.dbconn.commit()
-        except Exception as ex:
-            print(ex, file=sys.stderr)
-            pop_results = []
+                self.dbconn.commit()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+                pop_results = []
+
+        # the popped schedules are already claimed(processing),
+        # so the one which can't be read is moved to the dlq instead of staying claimed forever.
+        schedules = list()
+        for pop_result in pop_results:
+            try:
+                schedules.append(
+                    self._generate_schedule_dict(pop_result[0], pop_result[3])
+                )
+            except Exception as ex:
+                print(f"invalid payload of {pop_result[0]}: {ex}", file=sys.stderr)
+                self.move_to_dlq(pop_result[0], pop_result[3])
 
-        return [
-            self._generate_schedule_dict(pop_result[0], pop_result[3])
-            for pop_result in pop_results
-        ]
+        return schedules
 
     def update(self, id, next_schedule, payload):
         """
@@ -319,18 +442,55 @@ class PGScheduleQueue(ScheduleQueue):
         # TODO: need to configure this table name
         table_name = PGScheduleQueue.SCHEDULE_TABLE
 
-        payload_str = json.dumps(payload) if type(payload) == dict else payload
+        payload_str = dumps_payload(payload) if type(payload) == dict else payload
 
         sql_update = f"""
         UPDATE {table_name} SET next_schedule = %s, processing_started_at = NULL, payload = %s where id = %s;
         """
 
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_update, (next_schedule, payload_str, id))
-            self.dbconn.commit()
-        except Exception as ex:
-            print(ex, file=sys.stderr)
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_update, (next_schedule, payload_str, id))
+                self.dbconn.commit()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
+
+    def move_to_dlq(self, id, payload):
+        """
+        최대 재시도 횟수를 넘어 무효화된 스케줄을 스케줄 큐에서 삭제하고 DLQ 테이블로 옮긴다.
+        삭제와 추가는 하나의 SQL 문으로 처리되어 한번에 반영된다.
+
+        """
+
+        self.check_database_initialized()
+
+        # TODO: need to configure this table name
+        table_name = PGScheduleQueue.SCHEDULE_TABLE
+        dlq_table_name = PGScheduleQueue.DLQ_TABLE
+
+        payload_str = dumps_payload(payload) if type(payload) == dict else payload
+
+        sql_move = f"""
+        WITH moved AS (
+            DELETE FROM {table_name} WHERE id = %s
+            RETURNING id, name, next_schedule, created_at
+        )
+        INSERT INTO {dlq_table_name} (id, name, next_schedule, created_at, moved_at, payload)
+            SELECT id, name, next_schedule, created_at, NOW() AT TIME ZONE 'UTC', %s FROM moved
+            ON CONFLICT (id)
+            DO UPDATE SET (moved_at, payload) = (EXCLUDED.moved_at, EXCLUDED.payload);
+        """
+
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_move, (id, payload_str))
+                self.dbconn.commit()
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
 
     def initialize(self) -> None:
         """
@@ -345,25 +505,43 @@ class PGScheduleQueue(ScheduleQueue):
         table_name = PGScheduleQueue.SCHEDULE_TABLE
 
         sql_get = f"""
-        SELECT id, name, next_schedule, payload from {table_name};
-
+        SELECT id, payload from {table_name} WHERE processing_started_at IS NOT NULL;
         """
 
         sql_update = f"""
-        UPDATE {table_name} SET processing_started_at = NULL WHERE id = %s;
+        UPDATE {table_name} SET processing_started_at = NULL WHERE id = ANY(%s::uuid[]);
         """
 
-        try:
-            with self.dbconn.cursor() as cursor:
-                cursor.execute(sql_get)
-                fetch_results = cursor.fetchall()
-
-                for fetch_result in fetch_results:
-                    fetched_id = fetch_result[0]
-                    fetched_payload = fetch_result[3]
-                    fetched_payload_dict = json.loads(fetched_payload)
-                    if fetched_payload_dict["type"] in ["delay_recur", "cron"]:
-                        cursor.execute(sql_update, (fetched_id,))
+        with self.dbconn_lock:
+            try:
+                with self.dbconn.cursor() as cursor:
+                    cursor.execute(sql_get)
+                    fetch_results = cursor.fetchall()
+
+                    # the payload is read in python(not cast to jsonb in sql), so a row
+                    # having NaN/Infinity or an invalid payload doesn't fail the reset.
+                    recurring_ids = list()
+                    for fetched_id, fetched_payload in fetch_results:
+                        try:
+                            fetched_payload_dict = loads_payload(fetched_payload)
+                        except Exception as ex:
+                            print(
+                                f"invalid payload of {fetched_id}: {ex}",
+                                file=sys.stderr,
+                            )
+                            continue
+
+                        if not isinstance(fetched_payload_dict, dict):
+                            print(f"invalid payload of {fetched_id}", file=sys.stderr)
+                            continue
+
+                        schedule_type = fetched_payload_dict.get("type")
+                        if schedule_type in ScheduleType.RECURRING_TYPES:
+                            recurring_ids.append(str(fetched_id))
+
+                    if recurring_ids:
+                        cursor.execute(sql_update, (recurring_ids,))
                 self.dbconn.commit()
-        except Exception as ex:
-            print(ex, file=sys.stderr)
+            except Exception as ex:
+                print(ex, file=sys.stderr)
+                self.dbconn.rollback()
@@ -7,5 +7,5 @@ class ScheduleQueue(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def pop(self):
+    def pop(self, count: int = 1):
         pass
@@ -35,12 +35,12 @@ class TaskKafka(Task):
                 else str(task_info["data"])
             ).encode()
 
-            log_debug(f"connection: {connection}")
+            log_debug("connection: %s", connection)
             producer = AIOKafkaProducer(bootstrap_servers=connection["host"])
             # Get cluster layout and initial topic/partition leadership information
             await producer.start()
             try:
-                log_debug(f"topic: {topic}, data: {produce_data}")
+                log_debug("topic: %s, data: %s", topic, produce_data)
                 # Produce message
                 await producer.send_and_wait(topic, produce_data)
             finally:
@@ -48,7 +48,7 @@ class TaskKafka(Task):
                 await producer.stop()
 
         except Exception as ex:
-            log_error("Exception: ", ex)
+            log_error("Exception: %s", ex)
         finally:
             # Wait for any outstanding messages to be delivered and delivery report
             # callbacks to be triggered.
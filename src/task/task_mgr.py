@@ -10,11 +10,9 @@ class TaskManager:
 
     @staticmethod
     def get(type: str):
-        task = None
-        try:
-            task = TaskManager.REGISTRED_TASK_INFO[type]
-        except KeyError as keyerr:
-            print(f"not support this type: {keyerr}")
+        task = TaskManager.REGISTRED_TASK_INFO.get(type)
+        if task is None:
+            print(f"not support this type: {type}")
 
         return task
 
@@ -41,14 +41,14 @@ class TaskRedis(Task):
                 else str(task_info["data"])
             ).encode()
 
-            log_debug(f"connection: {connection}")
+            log_debug("connection: %s", connection)
             redis_cli = aioredis.from_url(connection["host"])
 
-            log_debug(f"topic: {topic}, data: {data}")
+            log_debug("topic: %s, data: %s", topic, data)
             await redis_cli.publish(topic, data)
 
         except Exception as ex:
-            log_error("Exception: ", ex)
+            log_error("Exception: %s", ex)
 
 
 TaskManager.register("redis", TaskRedis)
@@ -17,11 +17,18 @@ log_error = log_message.error
 
 
 class TaskRest(Task):
+    # shared by all the rest tasks so that the connection pool is reused
+    CLIENT = None
+
     def __init__(self):
-        self.client = httpx.AsyncClient(
-            timeout=None,
-            limits=httpx.Limits(max_keepalive_connections=None, keepalive_expiry=None),
-        )
+        if TaskRest.CLIENT is None:
+            TaskRest.CLIENT = httpx.AsyncClient(
+                timeout=None,
+                limits=httpx.Limits(
+                    max_keepalive_connections=None, keepalive_expiry=None
+                ),
+            )
+        self.client = TaskRest.CLIENT
         self.host = ""
         self.headers = dict()
         self.data = dict()
@@ -59,7 +66,7 @@ class TaskRest(Task):
                 data=data,
                 timeout=httpx.Timeout(timeout=None),
             )
-            log_debug(f"result: {res.status_code}")
+            log_debug("result: %s", res.status_code)
             result = True if res.status_code == 200 else False
 
         except Exception as ex:
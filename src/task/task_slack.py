@@ -6,8 +6,13 @@ from task.task_mgr import TaskManager
 
 
 class TaskSlack(Task):
+    # shared by all the slack tasks so that the connection pool is reused
+    CLIENT = None
+
     def __init__(self):
-        self.client = httpx.AsyncClient()
+        if TaskSlack.CLIENT is None:
+            TaskSlack.CLIENT = httpx.AsyncClient()
+        self.client = TaskSlack.CLIENT
 
     def get_name(self):
         return "slack"
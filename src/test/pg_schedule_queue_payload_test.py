@@ -0,0 +1,69 @@
+from unittest import TestCase, main
+
+import math
+from schedule_queue.pg_schedule_queue import (
+    NonFiniteFloat,
+    loads_payload,
+    dumps_payload,
+)
+
+
+class PGScheduleQueuePayloadTest(TestCase):
+    def assert_round_trip(self, value):
+        payload = {"task": {"data": {"v": value}}}
+
+        loaded = loads_payload(dumps_payload(payload))
+        self.assertEqual(loaded, payload)
+        self.assertIs(type(loaded["task"]["data"]["v"]), int)
+
+        # written back by update()/put() without any change
+        self.assertEqual(loads_payload(dumps_payload(loaded)), payload)
+
+    def test_negative_19_digit_integers(self):
+        self.assert_round_trip(-(2**63))
+        self.assert_round_trip(-(2**63) - 1)
+        self.assert_round_trip(-9999999999999999999)
+
+    def test_positive_19_digit_integers(self):
+        self.assert_round_trip(2**63 - 1)
+        self.assert_round_trip(2**63)
+        self.assert_round_trip(9999999999999999999)
+
+    def test_20_digit_integers(self):
+        self.assert_round_trip(2**64 - 1)
+        self.assert_round_trip(2**64)
+        self.assert_round_trip(-(2**64))
+        self.assert_round_trip(123456789012345678901234567890)
+
+    def test_non_finite_rows_written_by_json(self):
+        loaded = loads_payload(
+            '{"type": "cron", "x": NaN, "y": Infinity, "z": -Infinity}'
+        )
+
+        self.assertTrue(math.isnan(loaded["x"]))
+        self.assertEqual(loaded["y"], math.inf)
+        self.assertEqual(loaded["z"], -math.inf)
+        for key in ["x", "y", "z"]:
+            self.assertIsInstance(loaded[key], NonFiniteFloat)
+
+    def test_non_finite_float_round_trip(self):
+        loaded = loads_payload('{"type": "cron", "x": NaN, "y": -Infinity}')
+        written = dumps_payload(loaded)
+
+        self.assertEqual(written, '{"type": "cron", "x": NaN, "y": -Infinity}')
+        reloaded = loads_payload(written)
+        self.assertTrue(math.isnan(reloaded["x"]))
+        self.assertEqual(reloaded["y"], -math.inf)
+
+    def test_plain_payload(self):
+        payload = {"type": "delay", "schedule": "10", "task": {"data": {"v": 1.5}}}
+
+        self.assertEqual(loads_payload(dumps_payload(payload)), payload)
+
+    def test_invalid_payload(self):
+        with self.assertRaises(ValueError):
+            loads_payload("{invalid")
+
+
+if __name__ == "__main__":
+    main()
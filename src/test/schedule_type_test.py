@@ -0,0 +1,32 @@
+from unittest import TestCase, main
+
+from datetime import datetime
+from schedule.schedule_type import ScheduleType
+
+
+class ScheduleTypeTest(TestCase):
+    def test_cron_time_parsed_once(self):
+        cron_time = ScheduleType.get_cron_time("0 */5 * * * *", "Asia/Seoul")
+
+        self.assertIs(
+            cron_time, ScheduleType.get_cron_time("0 */5 * * * *", "Asia/Seoul")
+        )
+        self.assertIsNot(
+            cron_time, ScheduleType.get_cron_time("0 */5 * * * *", "UTC")
+        )
+
+    def test_cron_next_and_delay(self):
+        schedule_event = {"type": ScheduleType.CRON, "schedule": "0 */5 * * * *"}
+
+        for _ in range(3):
+            (next_time, delay) = ScheduleType.get_next_and_delay(
+                schedule_event, "Asia/Seoul"
+            )
+
+            self.assertGreater(next_time, datetime.now().timestamp())
+            self.assertEqual(next_time % 300, 0)
+            self.assertLessEqual(delay, 300)
+
+
+if __name__ == "__main__":
+    main()